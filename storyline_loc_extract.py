@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Storyline text extraction
+-------------------------
+Pulls likely translatable strings out of an Articulate Storyline *.story package
+(a zip of XML/JSON entries). Kept free of Streamlit so it can be imported on its own:
+by storyline_loc_estimator.py, by tests, and by process-pool workers.
+"""
+
+import io
+import json
+import multiprocessing
+import re
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from html import unescape
+
+import lxml.etree as LET
+
+# Optional: orjson parses the package's JSON entries much faster
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+WS_RE = re.compile(r'\s+', re.UNICODE)
+NONWORD_RE = re.compile(r'[\W_]+')
+HEXID_RE = re.compile(r'[0-9A-Fa-f-]{8,}')
+NUMBER_RE = re.compile(r'[-+]?\d+(\.\d*)?([eE][-+]?\d+)?')
+# Each CJK character or Latin-script word counts as one word
+WC_RE = re.compile(r"([一-鿿぀-ヿ가-힯])|([A-Za-zÀ-ÖØ-öø-ÿ0-9']+)")
+
+TRANSLATABLE_ATTRS = {
+    'alt','title','label','aria-label','aria_title','tooltip','placeholder',
+    'value','caption','text','content','name','displayName'
+}
+
+NOISE_ATTRS = {
+    'id','uid','guid','rid','x','y','w','h','left','top','width','height',
+    'style','class','ctype','type','lang','language','src','href','fill','stroke',
+    'font','fontSize','color','alignment','bold','italic','underline'
+}
+
+LIKELY_TEXT_TAGS = {
+    'text','p','span','div','tspan','title','desc','caption','para','run',
+    'li','h1','h2','h3','h4','h5','h6','td','th','label','value','name','g'
+}
+
+SKIP_TAGS = {
+    'style','script','defs','metadata','font','image','img','svg','use','clipPath'
+}
+
+# Letter ranges that mark a string as human text: Latin (incl. Latin-1 and Extended-A),
+# Cyrillic, Hebrew, Arabic, Devanagari, Thai, CJK ideographs, Hiragana, Hangul
+HUMAN_RANGES = (
+    (0x41, 0x5A), (0x61, 0x7A), (0xC0, 0xD6), (0xD8, 0xF6), (0xF8, 0xFF), (0x100, 0x17E),
+    (0x400, 0x45F), (0x5D0, 0x5EA), (0x600, 0x6FF), (0x900, 0x97F), (0xE01, 0xE5B),
+    (0x4E00, 0x9FA5), (0x3041, 0x309F), (0xAC00, 0xD7A3),
+)
+# Lookup set over those ranges; isdisjoint() scans a string in C and stops at the first hit
+HUMAN_CHARS = frozenset(chr(c) for lo, hi in HUMAN_RANGES for c in range(lo, hi + 1))
+
+# Below this many XML/JSON entries a process pool costs more than it saves
+PARALLEL_MIN_ENTRIES = 16
+
+def normalize_text(s: str) -> str:
+    if s is None:
+        return ''
+    s = unescape(s)
+    s = s.replace('\u00A0', ' ')
+    s = WS_RE.sub(' ', s).strip()
+    return s
+
+def is_likely_human_text(s: str) -> bool:
+    if not s:
+        return False
+    return not HUMAN_CHARS.isdisjoint(s)
+
+def should_skip_text(s: str) -> bool:
+    if not s or s == '-':
+        return True
+    if NONWORD_RE.fullmatch(s):
+        return True
+    if HEXID_RE.fullmatch(s):
+        return True
+    return False
+
+def load_json_bytes(data: bytes):
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # invalid UTF-8 or NaN/Infinity literals: retry with the lenient stdlib path
+    return json.loads(data.decode('utf-8', errors='ignore'))
+
+def iter_zip_entries(zf: zipfile.ZipFile):
+    for info in zf.infolist():
+        name_lower = info.filename.lower()
+        if any(name_lower.endswith(ext) for ext in ('.xml', '.htm', '.html', '.json')) and not info.is_dir():
+            yield info
+
+def iterparse_xml_bytes(data: bytes):
+    """Stream (event, elem, path) over an XML payload without building the full tree.
+
+    path is the '/'-joined local tags of elem's ancestors ('' for the root), kept as one
+    prefix string per depth so no per-node list is built. Once an 'end' event has been
+    consumed the element is cleared (its tail is kept for the caller) and its preceding
+    siblings are dropped, so peak memory stays near one element's worth of the document.
+    """
+    prefixes = ['']
+    for event, elem in LET.iterparse(io.BytesIO(data), events=("start", "end"),
+                                     huge_tree=True, remove_comments=True, remove_pis=True):
+        if event == "start":
+            yield event, elem, prefixes[-1]
+            prefixes.append(f"{prefixes[-1]}/{local_name(elem.tag)}")
+            continue
+        prefixes.pop()
+        yield event, elem, prefixes[-1]
+        elem.clear(keep_tail=True)
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+def local_name(tag: str) -> str:
+    return tag.split('}', 1)[-1] if '}' in tag else tag
+
+def location(path: str, tag: str, leaf: str) -> str:
+    # The same few locations repeat across thousands of rows; interning them keeps one
+    # shared string per distinct path in the dedup dict instead of a copy per row.
+    return sys.intern(f"{path}/{tag}/{leaf}")
+
+def _collect_tail(elem, path, file_id, out_rows):
+    tail = normalize_text(elem.tail or '')
+    if tail and is_likely_human_text(tail) and not should_skip_text(tail):
+        out_rows[(file_id, location(path, local_name(elem.tag), '#tail'), tail)] = None
+
+def walk_xml_collect(data: bytes, file_id, out_rows, include_alttext=True):
+    # Rows are only merged once the whole entry has parsed: a malformed entry is retried
+    # with control bytes stripped and otherwise dropped, as with the old fromstring parse.
+    rows = {}
+    try:
+        _walk_xml(data, file_id, rows, include_alttext)
+    except LET.XMLSyntaxError:
+        rows = {}
+        try:
+            _walk_xml(re.sub(rb'[^\x09\x0A\x0D\x20-\xFF]+', b'', data), file_id, rows, include_alttext)
+        except LET.XMLSyntaxError:
+            return
+    out_rows.update(rows)
+
+def _walk_xml(data: bytes, file_id, out_rows, include_alttext):
+    # Tails only become known after an element's end event, so each one is collected
+    # when its next sibling (or its parent) ends, before iterparse_xml_bytes frees it.
+    skip_depth = 0
+    for event, elem, path in iterparse_xml_bytes(data):
+        tag = local_name(elem.tag)
+        if event == "start":
+            if skip_depth or tag in SKIP_TAGS:
+                skip_depth += 1
+            continue
+
+        skipped = skip_depth > 0
+        if skipped:
+            skip_depth -= 1
+        if skip_depth:
+            continue
+
+        prev = elem.getprevious()
+        if prev is not None and local_name(prev.tag) not in SKIP_TAGS:
+            _collect_tail(prev, path, file_id, out_rows)
+        if skipped:
+            continue
+
+        attrs = { local_name(k): v for k, v in elem.attrib.items() }
+        if not include_alttext:
+            for v in attrs.values():
+                if isinstance(v, str) and '.AltText' in v:
+                    # skip collecting from this node (but still descend in case children hold non-alt text)
+                    break
+
+        txt = normalize_text(elem.text or '')
+        if txt and (tag in LIKELY_TEXT_TAGS or is_likely_human_text(txt)) and not should_skip_text(txt):
+            out_rows[(file_id, location(path, tag, '#text'), txt)] = None
+
+        for kk, v in attrs.items():
+            if kk in NOISE_ATTRS:
+                continue
+            translatable = kk in TRANSLATABLE_ATTRS
+            # Without entities normalizing can't change whether v looks human, so most
+            # non-text attributes (ids, coordinates, styles) drop out before normalize_text
+            if not translatable and '&' not in v and not is_likely_human_text(v):
+                continue
+            val = normalize_text(v)
+            if translatable or is_likely_human_text(val):
+                if not should_skip_text(val):
+                    out_rows[(file_id, location(path, tag, f'@{kk}'), val)] = None
+
+        if len(elem) and local_name(elem[-1].tag) not in SKIP_TAGS:
+            _collect_tail(elem[-1], f"{path}/{tag}", file_id, out_rows)
+        if not path:
+            _collect_tail(elem, path, file_id, out_rows)
+
+def extract_from_json(doc, file_id, out_rows):
+    if isinstance(doc, dict):
+        for k, v in doc.items():
+            new_path = sys.intern(f"$.{k}")
+            if isinstance(v, (dict, list)):
+                extract_from_json(v, file_id, out_rows)
+            else:
+                if isinstance(v, (str, int, float)):
+                    # orjson turns ints wider than 64 bits into floats, whose exponent
+                    # form would otherwise pass as text
+                    if not isinstance(v, str) and NUMBER_RE.fullmatch(str(v)):
+                        continue
+                    val = normalize_text(str(v))
+                    if val and is_likely_human_text(val) and not should_skip_text(val):
+                        if k.lower() not in NOISE_ATTRS:
+                            out_rows[(file_id, new_path, val)] = None
+    elif isinstance(doc, list):
+        for i, v in enumerate(doc):
+            extract_from_json(v, file_id, out_rows)
+
+def parse_entry(item):
+    """Extract the (file_id, path, text) keys from one package entry.
+
+    Takes a single (filename, data, include_alttext) tuple so it can be handed to
+    ProcessPoolExecutor.map as-is.
+    """
+    filename, data, include_alttext = item
+    rows = {}
+    if filename.lower().endswith('.json'):
+        try:
+            doc = load_json_bytes(data)
+            extract_from_json(doc, filename, rows)
+        except Exception:
+            pass
+    else:
+        walk_xml_collect(data, filename, rows, include_alttext=include_alttext)
+    return list(rows)
+
+def extract_rows_from_story(story_bytes: bytes, skip_alttext=True, processes=1):
+    # (file_id, path, text) -> None; dict keys dedupe while keeping first-seen order
+    rows = {}
+    media_counts = {"images":0, "audio":0, "video":0, "other":0}
+    items = []
+    with zipfile.ZipFile(io.BytesIO(story_bytes), 'r') as zf:
+        for info in zf.infolist():
+            name_lower = info.filename.lower()
+            if name_lower.endswith(('.png','.jpg','.jpeg','.gif','.svg','.webp')):
+                media_counts["images"] += 1
+            elif name_lower.endswith(('.mp3','.wav','.m4a','.ogg')):
+                media_counts["audio"] += 1
+            elif name_lower.endswith(('.mp4','.webm','.mov','.m4v')):
+                media_counts["video"] += 1
+            elif not info.is_dir() and not name_lower.endswith(('.xml','.htm','.html','.json')):
+                media_counts["other"] += 1
+
+            if any(name_lower.endswith(ext) for ext in ('.xml', '.htm', '.html', '.json')) and not info.is_dir():
+                try:
+                    data = zf.read(info)
+                except Exception:
+                    continue
+                items.append((info.filename, data, not skip_alttext))
+
+    # Entries parse independently, so with processes > 1 they are spread over a pool once
+    # there are enough of them to pay for its start-up. Workers are always spawned: forking
+    # a threaded parent (such as the Streamlit server) can deadlock the child. A spawned
+    # worker re-runs the caller's __main__, so only callers whose main module is guarded
+    # should ask for a pool; a `streamlit run` script is not and stays serial.
+    results = None
+    if processes > 1 and len(items) >= PARALLEL_MIN_ENTRIES:
+        try:
+            with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn")) as ex:
+                results = list(ex.map(parse_entry, items, chunksize=8))
+        except (OSError, BrokenProcessPool):
+            # e.g. sandboxes that don't allow starting processes
+            results = None
+    if results is None:
+        results = map(parse_entry, items)
+    for entry_rows in results:
+        rows.update(dict.fromkeys(entry_rows))
+
+    # Hand back one list per column so the DataFrame can be built without a row-to-column pivot.
+    # Rows stay in first-seen order; callers sort (see sort_rows).
+    files = [r[0] for r in rows]
+    paths = [r[1] for r in rows]
+    texts = [r[2] for r in rows]
+    return (files, paths, texts), media_counts
+
+def sort_rows(df):
+    """Order rows by source file, then location, case-insensitively (stable for ties)."""
+    keyed = df.assign(_f=df["source_file"].str.lower(), _l=df["location"].str.lower())
+    return keyed.sort_values(["_f", "_l"], kind="stable").drop(columns=["_f", "_l"])
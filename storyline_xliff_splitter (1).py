@@ -30,13 +30,15 @@ Then open the local URL it prints (usually http://localhost:8501).
 
 from __future__ import annotations
 import argparse
-import copy
 import io
+import itertools
 import os
 import re
 import sys
+import tempfile
 import xml.etree.ElementTree as ET
-from typing import Iterable, List, Optional, Tuple
+from xml.sax.saxutils import escape
+from typing import BinaryIO, Iterable, List, Optional, Tuple, Union
 
 # Try enabling Streamlit mode if available
 _ST_MODE = False
@@ -46,6 +48,14 @@ try:
 except Exception:
     _ST_MODE = False
 
+# Optional: pyahocorasick speeds up patterns that are plain keyword lists
+_AC_MODE = False
+try:
+    import ahocorasick  # type: ignore
+    _AC_MODE = True
+except Exception:
+    _AC_MODE = False
+
 # XLIFF 1.2 default namespace (commonly present but sometimes omitted in Storyline exports)
 XLIFF_NS = "urn:oasis:names:tc:xliff:document:1.2"
 
@@ -55,6 +65,17 @@ def q(tag: str) -> str:
     return f"{{{XLIFF_NS}}}{tag}"
 
 
+TU_TAGS = {q("trans-unit"), "trans-unit"}
+CONTEXT_GROUP_TAG = q("context-group")
+CONTEXT_TAG = q("context")
+HINT_ATTRS = ("id", "resname", "res-id", "extradata", "x-articulate-part")
+FILE_TAGS = {q("file"), "file"}
+BODY_TAGS = {q("body"), "body"}
+XML_DECLARATION = "<?xml version='1.0' encoding='utf-8'?>\n"
+
+REGEX_META = set(".^$*+?{}[]\\|()")
+
+
 def findall(elem: ET.Element, tag: str) -> List[ET.Element]:
     results = elem.findall(q(tag))
     if not results:
@@ -62,22 +83,6 @@ def findall(elem: ET.Element, tag: str) -> List[ET.Element]:
     return results
 
 
-def find(elem: ET.Element, tag: str) -> Optional[ET.Element]:
-    node = elem.find(q(tag))
-    if node is None:
-        node = elem.find(tag)
-    return node
-
-
-def iter_trans_units(root: ET.Element) -> Iterable[ET.Element]:
-    for f in findall(root, "file"):
-        body = find(f, "body")
-        if body is None:
-            continue
-        for tu in findall(body, "trans-unit"):
-            yield tu
-
-
 def get_text_recursive(elem: Optional[ET.Element]) -> str:
     if elem is None:
         return ""
@@ -85,93 +90,172 @@ def get_text_recursive(elem: Optional[ET.Element]) -> str:
 
 
 def contexts_for_tu(tu: ET.Element) -> List[str]:
+    if len(tu) == 0 and not any(key in tu.attrib for key in HINT_ATTRS):
+        return []
     texts: List[str] = []
     for n in findall(tu, "note"):
         t = get_text_recursive(n)
         if t:
             texts.append(t)
     # <context-group>/<context> sometimes present
-    for cg in tu.findall("context-group") + tu.findall(q("context-group")):
-        for c in cg.findall("context") + cg.findall(q("context")):
+    for cg in itertools.chain(tu.iterfind("context-group"), tu.iterfind(CONTEXT_GROUP_TAG)):
+        for c in itertools.chain(cg.iterfind("context"), cg.iterfind(CONTEXT_TAG)):
             t = get_text_recursive(c)
             if t:
                 texts.append(t)
             for v in c.attrib.values():
                 if v:
                     texts.append(v)
-    for key in ("id", "resname", "res-id", "extradata", "x-articulate-part"):
+    for key in HINT_ATTRS:
         val = tu.attrib.get(key)
         if val:
             texts.append(val)
     return [t for t in (s.strip() for s in texts) if t]
 
 
-def matches_any(texts: Iterable[str], patterns: List[re.Pattern]) -> bool:
-    for t in texts:
-        for p in patterns:
-            if p.search(t):
-                return True
-    return False
+def contains_any_keyword(automaton, text: str) -> bool:
+    return next(automaton.iter(text.lower()), None) is not None
 
 
-def build_patterns(expr: str) -> List[re.Pattern]:
+def matches_any(texts: Iterable[str], pattern: Optional[Union[re.Pattern, ahocorasick.Automaton]]) -> bool:
+    if pattern is None:
+        return False
+    if isinstance(pattern, re.Pattern):
+        return any(pattern.search(t) for t in texts)
+    return any(contains_any_keyword(pattern, t) for t in texts)
+
+
+def build_patterns(expr: str) -> Optional[Union[re.Pattern, ahocorasick.Automaton]]:
     parts = re.split(r"(?<!\\)\|", expr) if "|" in expr else [expr]
-    compiled: List[re.Pattern] = []
-    for part in parts:
-        part = part.strip()
-        if not part:
-            continue
-        compiled.append(re.compile(part, flags=re.IGNORECASE))
-    return compiled
-
-
-def clone_shell(tree: ET.ElementTree) -> ET.ElementTree:
-    root = tree.getroot()
-    new_root = copy.deepcopy(root)
-    # Clear all trans-units in the copy
-    for f in findall(new_root, "file"):
-        body = find(f, "body")
-        if body is not None:
-            to_remove = [tu for tu in list(body) if tu.tag in {q("trans-unit"), "trans-unit"}]
-            for tu in to_remove:
-                body.remove(tu)
-    return ET.ElementTree(new_root)
-
-
-def append_tu_to_output_shell(shell: ET.ElementTree, tu: ET.Element):
-    root = shell.getroot()
-    for f in findall(root, "file"):
-        body = find(f, "body")
-        if body is not None:
-            body.append(copy.deepcopy(tu))
-            return
-    raise RuntimeError("No <file>/<body> found in shell to append trans-unit.")
+    parts = [part.strip() for part in parts if part.strip()]
+    if not parts:
+        return None
+    if _AC_MODE and not any(REGEX_META & set(part) for part in parts):
+        automaton = ahocorasick.Automaton()
+        for part in parts:
+            automaton.add_word(part.lower(), part)
+        automaton.make_automaton()
+        return automaton
+    return re.compile("|".join(f"(?:{part})" for part in parts), flags=re.IGNORECASE)
+
+
+def _emit(outputs: Iterable[BinaryIO], markup: str) -> None:
+    data = markup.encode("utf-8")
+    for out in outputs:
+        out.write(data)
+
+
+def _strip_default_ns(xml: str, elem: ET.Element) -> str:
+    if elem.tag.startswith(f"{{{XLIFF_NS}}}"):
+        return xml.replace(f' xmlns="{XLIFF_NS}"', "", 1)
+    return xml
+
+
+def serialize_unit(elem: ET.Element) -> str:
+    tail, elem.tail = elem.tail, None
+    try:
+        return _strip_default_ns(ET.tostring(elem, encoding="unicode"), elem)
+    finally:
+        elem.tail = tail
+
+
+def shell_tags(elem: ET.Element, nested: bool) -> Tuple[str, str]:
+    empty = ET.tostring(ET.Element(elem.tag, elem.attrib), encoding="unicode")  # "<tag ... />"
+    if nested:
+        empty = _strip_default_ns(empty, elem)
+    name = re.match(r"<([^\s/>]+)", empty).group(1)
+    return empty[:-3] + ">", f"</{name}>"
+
+
+class _OpenShell:
+    def __init__(self, elem: ET.Element, end_tag: str):
+        self.elem = elem
+        self.end_tag = end_tag
+        self.has_children = False
+        self.last_child: Optional[ET.Element] = None
+        self.last_child_outputs: Tuple[BinaryIO, ...] = ()
+
+    def begin_child(self, outputs: Tuple[BinaryIO, ...]) -> None:
+        if not self.has_children:
+            self.has_children = True
+            _emit(outputs, escape(self.elem.text or ""))
+        elif self.last_child is not None:
+            _emit(self.last_child_outputs, escape(self.last_child.tail or ""))
+
+    def end_child(self, child: ET.Element, outputs: Tuple[BinaryIO, ...]) -> None:
+        self.last_child = child
+        self.last_child_outputs = outputs
+        self.elem.remove(child)
+
+    def close(self, outputs: Tuple[BinaryIO, ...]) -> None:
+        self.begin_child(outputs)
+        _emit(outputs, self.end_tag)
+
+
+def route_tu(
+    tu: ET.Element,
+    notes_pattern: Optional[Union[re.Pattern, ahocorasick.Automaton]],
+    alt_pattern: Optional[Union[re.Pattern, ahocorasick.Automaton]],
+    notes_out: BinaryIO,
+    main_out: BinaryIO,
+) -> Tuple[BinaryIO, ...]:
+    texts = contexts_for_tu(tu)
+    if matches_any(texts, notes_pattern):
+        return (notes_out,)
+    if matches_any(texts, alt_pattern):
+        return ()
+    return (main_out,)
 
 
 def filter_xliff(
-    tree: ET.ElementTree,
-    notes_patterns: List[re.Pattern],
-    alt_patterns: List[re.Pattern],
-) -> Tuple[ET.ElementTree, ET.ElementTree]:
-    notes_only = clone_shell(tree)
-    main_no_notes_alt = clone_shell(tree)
-    for tu in iter_trans_units(tree.getroot()):
-        texts = contexts_for_tu(tu)
-        is_notes = matches_any(texts, notes_patterns)
-        is_alt = matches_any(texts, alt_patterns)
-        if is_notes:
-            append_tu_to_output_shell(notes_only, tu)
+    source: Union[str, BinaryIO],
+    notes_pattern: Optional[Union[re.Pattern, ahocorasick.Automaton]],
+    alt_pattern: Optional[Union[re.Pattern, ahocorasick.Automaton]],
+    notes_out: BinaryIO,
+    main_out: BinaryIO,
+) -> None:
+    both = (notes_out, main_out)
+    stack: List[_OpenShell] = []
+    unit_depth = 0  # nesting level inside the element currently being parsed whole
+
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            opens_shell = not stack or (
+                (len(stack) == 1 and elem.tag in FILE_TAGS) or (len(stack) == 2 and elem.tag in BODY_TAGS)
+            )
+            if unit_depth or not opens_shell:
+                unit_depth += 1
+                continue
+            if not stack:
+                if elem.tag.startswith(f"{{{XLIFF_NS}}}"):
+                    ET.register_namespace("", XLIFF_NS)
+                _emit(both, XML_DECLARATION)
+            else:
+                stack[-1].begin_child(both)
+            start_tag, end_tag = shell_tags(elem, nested=bool(stack))
+            _emit(both, start_tag)
+            stack.append(_OpenShell(elem, end_tag))
+            continue
+
+        if unit_depth > 1:
+            unit_depth -= 1
             continue
-        if is_alt:
+        if unit_depth == 1:
+            unit_depth = 0
+            parent = stack[-1]
+            outputs = both
+            if len(stack) == 3 and elem.tag in TU_TAGS:
+                outputs = route_tu(elem, notes_pattern, alt_pattern, notes_out, main_out)
+            parent.begin_child(both)
+            _emit(outputs, serialize_unit(elem))
+            parent.end_child(elem, outputs)
             continue
-        append_tu_to_output_shell(main_no_notes_alt, tu)
-    return notes_only, main_no_notes_alt
 
+        shell = stack.pop()
+        shell.close(both)
+        if stack:
+            stack[-1].end_child(elem, both)
 
-def write_tree(tree: ET.ElementTree, path: str):
-    if tree.getroot().tag.startswith("{") and XLIFF_NS in tree.getroot().tag:
-        ET.register_namespace("", XLIFF_NS)
-    tree.write(path, encoding="utf-8", xml_declaration=True)
 
 ############################
 # CLI mode
@@ -195,21 +279,40 @@ def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     return parser.parse_args(argv)
 
 
+def _temp_sibling(path: str) -> str:
+    fd, tmp = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=os.path.dirname(path) or ".")
+    os.close(fd)
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(tmp, 0o666 & ~umask)
+    return tmp
+
 def _main_cli(argv: Optional[List[str]] = None) -> int:
     args = _parse_args(argv)
     if not args.input:
         print("Error: missing input XLIFF path.\nTry: python storyline_xliff_splitter.py input.xlf", file=sys.stderr)
         return 2
+    notes_pattern = build_patterns(args.notes_patterns)
+    alt_pattern = build_patterns(args.alt_patterns)
+    tmps: List[str] = []
     try:
-        tree = ET.parse(args.input)
+        for out in (args.out_notes, args.out_main):
+            tmps.append(_temp_sibling(out))
+        tmp_notes, tmp_main = tmps
+        with open(tmp_notes, "wb") as notes_out, open(tmp_main, "wb") as main_out:
+            filter_xliff(args.input, notes_pattern, alt_pattern, notes_out, main_out)
+        os.replace(tmp_notes, args.out_notes)
+        os.replace(tmp_main, args.out_main)
     except ET.ParseError as e:
         print(f"Failed to parse XLIFF: {e}", file=sys.stderr)
         return 2
-    notes_patterns = build_patterns(args.notes_patterns)
-    alt_patterns = build_patterns(args.alt_patterns)
-    notes_only, main_no_notes_alt = filter_xliff(tree, notes_patterns, alt_patterns)
-    write_tree(notes_only, args.out_notes)
-    write_tree(main_no_notes_alt, args.out_main)
+    except OSError as e:
+        print(f"Failed to split XLIFF: {e}", file=sys.stderr)
+        return 2
+    finally:
+        for tmp in tmps:
+            if os.path.exists(tmp):
+                os.remove(tmp)
     print(f"✓ Wrote {args.out_notes} (notes only)")
     print(f"✓ Wrote {args.out_main} (everything except notes & ALT text)")
     return 0
@@ -218,14 +321,6 @@ def _main_cli(argv: Optional[List[str]] = None) -> int:
 # Streamlit UI mode
 ############################
 
-def _bytes_from_tree(tree: ET.ElementTree) -> bytes:
-    buf = io.BytesIO()
-    if tree.getroot().tag.startswith("{") and XLIFF_NS in tree.getroot().tag:
-        ET.register_namespace("", XLIFF_NS)
-    tree.write(buf, encoding="utf-8", xml_declaration=True)
-    return buf.getvalue()
-
-
 def _main_streamlit() -> None:
     st.set_page_config(page_title="Storyline XLIFF Splitter", layout="centered")
     st.title("Storyline XLIFF Splitter")
@@ -245,32 +340,32 @@ def _main_streamlit() -> None:
     run = st.button("Split XLIFF", type="primary", disabled=uploaded is None)
 
     if run and uploaded is not None:
-        data = uploaded.read()
+        notes_pattern = build_patterns(notes_expr)
+        alt_pattern = build_patterns(alt_expr)
+        notes_buf, main_buf = io.BytesIO(), io.BytesIO()
         try:
-            tree = ET.parse(io.BytesIO(data))
+            filter_xliff(io.BytesIO(uploaded.read()), notes_pattern, alt_pattern, notes_buf, main_buf)
         except ET.ParseError as e:
             st.error(f"Failed to parse XLIFF: {e}")
             return
-        notes_patterns = build_patterns(notes_expr)
-        alt_patterns = build_patterns(alt_expr)
-        notes_only, main_no_notes_alt = filter_xliff(tree, notes_patterns, alt_patterns)
+        notes_bytes, main_bytes = notes_buf.getvalue(), main_buf.getvalue()
         st.success("Split complete.")
         st.download_button(
             label="Download — notes_only.xlf",
-            data=_bytes_from_tree(notes_only),
+            data=notes_bytes,
             file_name="notes_only.xlf",
             mime="application/xml",
         )
         st.download_button(
             label="Download — content_no_notes_alt.xlf",
-            data=_bytes_from_tree(main_no_notes_alt),
+            data=main_bytes,
             file_name="content_no_notes_alt.xlf",
             mime="application/xml",
         )
         st.markdown("\n")
         with st.expander("Preview (first 1000 chars)"):
-            st.code(_bytes_from_tree(notes_only)[:1000].decode("utf-8", errors="ignore"))
-            st.code(_bytes_from_tree(main_no_notes_alt)[:1000].decode("utf-8", errors="ignore"))
+            st.code(notes_bytes[:1000].decode("utf-8", errors="ignore"))
+            st.code(main_bytes[:1000].decode("utf-8", errors="ignore"))
 
 
 if __name__ == "__main__":
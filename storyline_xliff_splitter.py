@@ -16,20 +16,33 @@ Usage:
          --alt-patterns "Alt ?Text|AltText|Alternate Text|Accessibility|A11y|Image description"]
 
 Notes:
-- This script preserves structure (file/header/body) and metadata.
+- This script preserves structure (file/header/body) and metadata; each kept <trans-unit> stays in its own <file>/<body>.
+- The input is streamed, so memory use stays flat even for very large XLIFFs.
 - It only filters <trans-unit> elements. Non-translatable units are left untouched unless they’re <trans-unit>.
 - It will copy over <seg-source>, <source>, <target>, <note>, and <context-group> content as-is.
+- If pyahocorasick is installed, patterns made only of literal keywords are matched with Aho-Corasick.
 
 Tested with Python 3.9+.
 """
 
 from __future__ import annotations
 import argparse
-import copy
+import itertools
+import os
 import re
 import sys
+import tempfile
 import xml.etree.ElementTree as ET
-from typing import Iterable, List, Optional
+from xml.sax.saxutils import escape
+from typing import BinaryIO, Iterable, List, Optional, Tuple, Union
+
+# Optional: pyahocorasick speeds up patterns that are plain keyword lists
+_AC_MODE = False
+try:
+    import ahocorasick  # type: ignore
+    _AC_MODE = True
+except Exception:
+    _AC_MODE = False
 
 # XLIFF 1.2 default namespace (commonly present but sometimes omitted in Storyline exports)
 XLIFF_NS = "urn:oasis:names:tc:xliff:document:1.2"
@@ -42,6 +55,17 @@ def q(tag: str) -> str:
     return f"{{{XLIFF_NS}}}{tag}"
 
 
+TU_TAGS = {q("trans-unit"), "trans-unit"}
+CONTEXT_GROUP_TAG = q("context-group")
+CONTEXT_TAG = q("context")
+HINT_ATTRS = ("id", "resname", "res-id", "extradata", "x-articulate-part")
+FILE_TAGS = {q("file"), "file"}
+BODY_TAGS = {q("body"), "body"}
+XML_DECLARATION = "<?xml version='1.0' encoding='utf-8'?>\n"
+
+REGEX_META = set(".^$*+?{}[]\\|()")
+
+
 def findall(elem: ET.Element, tag: str) -> List[ET.Element]:
     # Try namespaced first; if nothing found, fallback to non-namespaced tag
     results = elem.findall(q(tag))
@@ -50,23 +74,6 @@ def findall(elem: ET.Element, tag: str) -> List[ET.Element]:
     return results
 
 
-def find(elem: ET.Element, tag: str) -> Optional[ET.Element]:
-    node = elem.find(q(tag))
-    if node is None:
-        node = elem.find(tag)
-    return node
-
-
-def iter_trans_units(root: ET.Element) -> Iterable[ET.Element]:
-    # XLIFF 1.2 structure: <xliff><file><body><trans-unit/></body></file></xliff>
-    for f in findall(root, "file"):
-        body = find(f, "body")
-        if body is None:
-            continue
-        for tu in findall(body, "trans-unit"):
-            yield tu
-
-
 def get_text_recursive(elem: Optional[ET.Element]) -> str:
     if elem is None:
         return ""
@@ -75,6 +82,10 @@ def get_text_recursive(elem: Optional[ET.Element]) -> str:
 
 def contexts_for_tu(tu: ET.Element) -> List[str]:
     """Collect textual hints for a trans-unit from common Storyline locations."""
+    # Nothing to look at: no child elements and none of the hint attributes
+    if len(tu) == 0 and not any(key in tu.attrib for key in HINT_ATTRS):
+        return []
+
     texts: List[str] = []
 
     # <note> elements often carry hints like "Notes", "Alt Text" etc.
@@ -84,8 +95,8 @@ def contexts_for_tu(tu: ET.Element) -> List[str]:
             texts.append(t)
 
     # <context-group>/<context> (not standardized, but used by many tools)
-    for cg in tu.findall("context-group") + tu.findall(q("context-group")):
-        for c in cg.findall("context") + cg.findall(q("context")):
+    for cg in itertools.chain(tu.iterfind("context-group"), tu.iterfind(CONTEXT_GROUP_TAG)):
+        for c in itertools.chain(cg.iterfind("context"), cg.iterfind(CONTEXT_TAG)):
             t = get_text_recursive(c)
             if t:
                 texts.append(t)
@@ -95,105 +106,186 @@ def contexts_for_tu(tu: ET.Element) -> List[str]:
                     texts.append(v)
 
     # Attributes can be indicative: id, resname, extradata, etc.
-    for key in ("id", "resname", "res-id", "extradata", "x-articulate-part"):
+    for key in HINT_ATTRS:
         val = tu.attrib.get(key)
         if val:
             texts.append(val)
 
-    # Sometimes hints are on the parent <group> or wrapper <g>
-    parent = tu.getparent() if hasattr(tu, "getparent") else None  # lxml only; ElementTree lacks getparent
-    # ElementTree doesn’t provide parent access; skipped unless running with lxml
+    # Hints on a parent <group> or wrapper <g> would need parent access, which ElementTree lacks
 
     # Normalize
     return [t for t in (s.strip() for s in texts) if t]
 
 
-def matches_any(texts: Iterable[str], patterns: List[re.Pattern]) -> bool:
-    for t in texts:
-        for p in patterns:
-            if p.search(t):
-                return True
-    return False
-
-
-def build_patterns(expr: str) -> List[re.Pattern]:
-    # Accept a single regex containing alternatives (e.g., "Alt ?Text|AltText|Alternate Text")
-    # Split on unescaped | for readability
-    parts = re.split(r"(?<!\\)\|", expr) if "|" in expr else [expr]
-    compiled: List[re.Pattern] = []
-    for part in parts:
-        part = part.strip()
-        if not part:
-            continue
-        compiled.append(re.compile(part, flags=re.IGNORECASE))
-    return compiled
-
-
-def clone_shell(tree: ET.ElementTree) -> ET.ElementTree:
-    """Create an empty copy of the XLIFF document with <file>/<body> shells preserved."""
-    root = tree.getroot()
-    new_root = copy.deepcopy(root)
+def contains_any_keyword(automaton, text: str) -> bool:
+    return next(automaton.iter(text.lower()), None) is not None
 
-    # Clear all trans-units in the copy
-    for f in findall(new_root, "file"):
-        body = find(f, "body")
-        if body is not None:
-            # Remove only direct children that are trans-units
-            to_remove = [tu for tu in list(body) if tu.tag in {q("trans-unit"), "trans-unit"}]
-            for tu in to_remove:
-                body.remove(tu)
 
-    return ET.ElementTree(new_root)
+def matches_any(texts: Iterable[str], pattern: Optional[Union[re.Pattern, ahocorasick.Automaton]]) -> bool:
+    if pattern is None:
+        return False
+    if isinstance(pattern, re.Pattern):
+        return any(pattern.search(t) for t in texts)
+    return any(contains_any_keyword(pattern, t) for t in texts)
 
 
-def append_tu_to_output_shell(shell: ET.ElementTree, tu: ET.Element):
-    # Append <trans-unit> to the first <file>/<body> matching the original structure.
-    # If multiple <file> elements exist, we naively put all TUs into the first one with a <body>.
-    root = shell.getroot()
-    for f in findall(root, "file"):
-        body = find(f, "body")
-        if body is not None:
-            body.append(copy.deepcopy(tu))
-            return
-    raise RuntimeError("No <file>/<body> found in shell to append trans-unit.")
+def build_patterns(expr: str) -> Optional[Union[re.Pattern, ahocorasick.Automaton]]:
+    # Accept a single regex containing alternatives (e.g., "Alt ?Text|AltText|Alternate Text")
+    # Split on unescaped | for readability, then recombine the cleaned-up parts into one
+    # alternation so each text is scanned once instead of once per part
+    parts = re.split(r"(?<!\\)\|", expr) if "|" in expr else [expr]
+    parts = [part.strip() for part in parts if part.strip()]
+    if not parts:
+        return None
+    # Plain keyword lists need no regex engine: match them all in one Aho-Corasick pass
+    if _AC_MODE and not any(REGEX_META & set(part) for part in parts):
+        automaton = ahocorasick.Automaton()
+        for part in parts:
+            automaton.add_word(part.lower(), part)
+        automaton.make_automaton()
+        return automaton
+    return re.compile("|".join(f"(?:{part})" for part in parts), flags=re.IGNORECASE)
+
+
+def _emit(outputs: Iterable[BinaryIO], markup: str) -> None:
+    data = markup.encode("utf-8")
+    for out in outputs:
+        out.write(data)
+
+
+def _strip_default_ns(xml: str, elem: ET.Element) -> str:
+    # ET declares the default namespace on every element it serializes on its own;
+    # nested elements inherit it from the output root, so drop the repeat
+    if elem.tag.startswith(f"{{{XLIFF_NS}}}"):
+        return xml.replace(f' xmlns="{XLIFF_NS}"', "", 1)
+    return xml
+
+
+def serialize_unit(elem: ET.Element) -> str:
+    """Serialize a fully parsed element, leaving out its tail (tails are written by the parent)."""
+    tail, elem.tail = elem.tail, None
+    try:
+        return _strip_default_ns(ET.tostring(elem, encoding="unicode"), elem)
+    finally:
+        elem.tail = tail
+
+
+def shell_tags(elem: ET.Element, nested: bool) -> Tuple[str, str]:
+    """Return the start and end tags for a <xliff>, <file> or <body> element."""
+    empty = ET.tostring(ET.Element(elem.tag, elem.attrib), encoding="unicode")  # "<tag ... />"
+    if nested:
+        empty = _strip_default_ns(empty, elem)
+    name = re.match(r"<([^\s/>]+)", empty).group(1)
+    return empty[:-3] + ">", f"</{name}>"
+
+
+class _OpenShell:
+    """A shell element whose start tag has been written to the outputs but not its end tag."""
+
+    def __init__(self, elem: ET.Element, end_tag: str):
+        self.elem = elem
+        self.end_tag = end_tag
+        self.has_children = False
+        self.last_child: Optional[ET.Element] = None
+        self.last_child_outputs: Tuple[BinaryIO, ...] = ()
+
+    def begin_child(self, outputs: Tuple[BinaryIO, ...]) -> None:
+        # Text and tails are only complete once the parser has moved past them, so the
+        # shell's text / the previous sibling's tail are written just before the next child
+        if not self.has_children:
+            self.has_children = True
+            _emit(outputs, escape(self.elem.text or ""))
+        elif self.last_child is not None:
+            _emit(self.last_child_outputs, escape(self.last_child.tail or ""))
+
+    def end_child(self, child: ET.Element, outputs: Tuple[BinaryIO, ...]) -> None:
+        self.last_child = child
+        self.last_child_outputs = outputs
+        # Drop the finished child so memory stays bounded by one unit, not the document
+        self.elem.remove(child)
+
+    def close(self, outputs: Tuple[BinaryIO, ...]) -> None:
+        self.begin_child(outputs)
+        _emit(outputs, self.end_tag)
+
+
+def route_tu(
+    tu: ET.Element,
+    notes_pattern: Optional[Union[re.Pattern, ahocorasick.Automaton]],
+    alt_pattern: Optional[Union[re.Pattern, ahocorasick.Automaton]],
+    notes_out: BinaryIO,
+    main_out: BinaryIO,
+) -> Tuple[BinaryIO, ...]:
+    texts = contexts_for_tu(tu)
+
+    # Notes go to the notes-only output and are NOT included in main
+    if matches_any(texts, notes_pattern):
+        return (notes_out,)
+
+    # Exclude ALT text from main
+    if matches_any(texts, alt_pattern):
+        return ()
+
+    # Otherwise include in main
+    return (main_out,)
 
 
 def filter_xliff(
-    tree: ET.ElementTree,
-    notes_patterns: List[re.Pattern],
-    alt_patterns: List[re.Pattern],
-):
-    notes_only = clone_shell(tree)
-    main_no_notes_alt = clone_shell(tree)
-
-    for tu in iter_trans_units(tree.getroot()):
-        texts = contexts_for_tu(tu)
-        is_notes = matches_any(texts, notes_patterns)
-        is_alt = matches_any(texts, alt_patterns)
-
-        # Add to notes-only if notes
-        if is_notes:
-            append_tu_to_output_shell(notes_only, tu)
-            # Do NOT include in main
+    source: Union[str, BinaryIO],
+    notes_pattern: Optional[Union[re.Pattern, ahocorasick.Automaton]],
+    alt_pattern: Optional[Union[re.Pattern, ahocorasick.Automaton]],
+    notes_out: BinaryIO,
+    main_out: BinaryIO,
+) -> None:
+    """Stream an XLIFF document into the notes-only and main outputs.
+
+    <xliff>, <file> and <body> are written to both outputs as they open and close; every
+    other element is parsed whole, written to the outputs it belongs to and then freed.
+    Trans-units directly inside a <body> are routed with route_tu; anything else (header,
+    groups, ...) goes to both outputs unchanged.
+    """
+    both = (notes_out, main_out)
+    stack: List[_OpenShell] = []
+    unit_depth = 0  # nesting level inside the element currently being parsed whole
+
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            opens_shell = not stack or (
+                (len(stack) == 1 and elem.tag in FILE_TAGS) or (len(stack) == 2 and elem.tag in BODY_TAGS)
+            )
+            if unit_depth or not opens_shell:
+                unit_depth += 1
+                continue
+            if not stack:
+                # Register namespace only if root is namespaced; avoids duplicating ns decls
+                if elem.tag.startswith(f"{{{XLIFF_NS}}}"):
+                    ET.register_namespace("", XLIFF_NS)
+                _emit(both, XML_DECLARATION)
+            else:
+                stack[-1].begin_child(both)
+            start_tag, end_tag = shell_tags(elem, nested=bool(stack))
+            _emit(both, start_tag)
+            stack.append(_OpenShell(elem, end_tag))
             continue
 
-        # Exclude ALT text from main
-        if is_alt:
+        if unit_depth > 1:
+            unit_depth -= 1
+            continue
+        if unit_depth == 1:
+            unit_depth = 0
+            parent = stack[-1]
+            outputs = both
+            if len(stack) == 3 and elem.tag in TU_TAGS:
+                outputs = route_tu(elem, notes_pattern, alt_pattern, notes_out, main_out)
+            parent.begin_child(both)
+            _emit(outputs, serialize_unit(elem))
+            parent.end_child(elem, outputs)
             continue
 
-        # Otherwise include in main
-        append_tu_to_output_shell(main_no_notes_alt, tu)
-
-    return notes_only, main_no_notes_alt
-
-
-def write_tree(tree: ET.ElementTree, path: str):
-    # Ensure namespace prefix for pretty outputs
-    root = tree.getroot()
-    # Register namespace only if root is namespaced; avoids duplicating ns decls
-    if root.tag.startswith("{") and XLIFF_NS in root.tag:
-        ET.register_namespace("", XLIFF_NS)
-    tree.write(path, encoding="utf-8", xml_declaration=True)
+        shell = stack.pop()
+        shell.close(both)
+        if stack:
+            stack[-1].end_child(elem, both)
 
 
 def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
@@ -214,22 +306,49 @@ def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     return parser.parse_args(argv)
 
 
+def _temp_sibling(path: str) -> str:
+    """Create an empty temp file next to `path` to be os.replace()d onto it.
+
+    Each call gets its own name, so the two outputs never share a temp file even when
+    they point at the same path. mkstemp creates it 0600; it gets the mode open() would
+    have given a new output instead.
+    """
+    fd, tmp = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=os.path.dirname(path) or ".")
+    os.close(fd)
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(tmp, 0o666 & ~umask)
+    return tmp
+
+
 def main(argv: Optional[List[str]] = None) -> int:
     args = parse_args(argv)
 
+    notes_pattern = build_patterns(args.notes_patterns)
+    alt_pattern = build_patterns(args.alt_patterns)
+
+    # Stream into sibling temp files and only move them into place once the whole input has
+    # been split, so a bad or missing input never clobbers existing outputs. The two replaces
+    # are not atomic as a pair: if the second one fails, the notes output is already new.
+    tmps: List[str] = []
     try:
-        tree = ET.parse(args.input)
+        for out in (args.out_notes, args.out_main):
+            tmps.append(_temp_sibling(out))
+        tmp_notes, tmp_main = tmps
+        with open(tmp_notes, "wb") as notes_out, open(tmp_main, "wb") as main_out:
+            filter_xliff(args.input, notes_pattern, alt_pattern, notes_out, main_out)
+        os.replace(tmp_notes, args.out_notes)
+        os.replace(tmp_main, args.out_main)
     except ET.ParseError as e:
         print(f"Failed to parse XLIFF: {e}", file=sys.stderr)
         return 2
-
-    notes_patterns = build_patterns(args.notes_patterns)
-    alt_patterns = build_patterns(args.alt_patterns)
-
-    notes_only, main_no_notes_alt = filter_xliff(tree, notes_patterns, alt_patterns)
-
-    write_tree(notes_only, args.out_notes)
-    write_tree(main_no_notes_alt, args.out_main)
+    except OSError as e:
+        print(f"Failed to split XLIFF: {e}", file=sys.stderr)
+        return 2
+    finally:
+        for tmp in tmps:
+            if os.path.exists(tmp):
+                os.remove(tmp)
 
     print(f"✓ Wrote {args.out_notes} (notes only)")
     print(f"✓ Wrote {args.out_main} (everything except notes & ALT text)")
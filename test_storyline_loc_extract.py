@@ -0,0 +1,90 @@
+import io
+import zipfile
+
+import pandas as pd
+
+import storyline_loc_extract as sle
+
+ENTRIES = {
+    "tails.xml": b"<r>Root text<a>One</a>Tail A<b><c>Inner</c>Last child tail</b>B tail</r>",
+    "skip.xml": (
+        b"<r><p>Before</p><style>p { x }<span>hidden</span>style inner</style>Style tail"
+        b"<svg><text>in svg</text></svg>After svg<p>After</p></r>"
+    ),
+    "ns.xml": (
+        b'<r xmlns="urn:a" xmlns:sl="urn:sl"><shape sl:title="Hello world" sl:id="Not text here"'
+        b' sl:width="10" data="Some words" code="1234"/></r>'
+    ),
+    "ctrl.xml": b"<r><t>Control\x01 chars\x02 here</t></r>",
+    "trunc.xml": b"<r><t>Complete</t><t>Truncated",
+    "page.html": b"<html><body><p>Hi<br>there</p></body></html>",
+    "entity.xml": b"<r><t>Caf&nbsp;here</t></r>",
+    "data.json": (
+        b'{"a": 123456789012345678901234567890, "b": -2.5e-07, "c": 42, "d": 1.5,'
+        b' "e": "Plain text", "id": "Skip me", "f": [{"g": "Nested text"}]}'
+    ),
+}
+
+EXPECTED = {
+    ("tails.xml", "/r/#text", "Root text"),
+    ("tails.xml", "/r/a/#text", "One"),
+    ("tails.xml", "/r/a/#tail", "Tail A"),
+    ("tails.xml", "/r/b/c/#text", "Inner"),
+    ("tails.xml", "/r/b/c/#tail", "Last child tail"),
+    ("tails.xml", "/r/b/#tail", "B tail"),
+    # SKIP_TAGS subtrees are dropped together with their own tails
+    ("skip.xml", "/r/p/#text", "Before"),
+    ("skip.xml", "/r/p/#text", "After"),
+    ("ns.xml", "/r/shape/@title", "Hello world"),
+    ("ns.xml", "/r/shape/@data", "Some words"),
+    # Retried with control bytes stripped
+    ("ctrl.xml", "/r/t/#text", "Control chars here"),
+    # Wide ints and exponent floats are numbers, not text
+    ("data.json", "$.e", "Plain text"),
+    ("data.json", "$.g", "Nested text"),
+}
+
+
+def make_story(entries):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for name, data in entries.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+def extract(entries, **kwargs):
+    (files, paths, texts), media = sle.extract_rows_from_story(make_story(entries), **kwargs)
+    return list(zip(files, paths, texts)), media
+
+
+def test_rows_match_expected():
+    rows, _ = extract(ENTRIES)
+    assert len(rows) == len(set(rows))
+    # Malformed entries (truncated, HTML void tags, undefined entities) yield no rows at all
+    assert set(rows) == EXPECTED
+
+
+def test_json_numbers_are_not_text():
+    rows = {}
+    sle.extract_from_json(
+        {"big": 1.2345678901234568e29, "exp": -2.5e-07, "int": 10**30, "flag": True, "t": "Words"}, "f.json", rows
+    )
+    assert set(rows) == {("f.json", "$.flag", "True"), ("f.json", "$.t", "Words")}
+
+
+def test_process_pool_matches_serial():
+    entries = {f"slide{i}.xml": b"<r><t>Slide %d text</t>tail %d</r>" % (i, i) for i in range(sle.PARALLEL_MIN_ENTRIES)}
+    entries.update(ENTRIES)
+    assert extract(entries, processes=2) == extract(entries)
+
+
+def test_sort_rows_is_case_insensitive_and_stable():
+    df = pd.DataFrame(
+        {
+            "source_file": ["b.xml", "A.xml", "a.xml", "a.xml", "B.xml"],
+            "location": ["/x", "/Y", "/y", "/Z", "/a"],
+            "text": ["1", "2", "3", "4", "5"],
+        }
+    )
+    assert list(sle.sort_rows(df)["text"]) == ["2", "3", "4", "5", "1"]
@@ -0,0 +1,150 @@
+import importlib.util
+import io
+import os
+import re
+import xml.etree.ElementTree as ET
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = ["storyline_xliff_splitter.py", "storyline_xliff_splitter (1).py"]
+
+NS = ' xmlns="urn:oasis:names:tc:xliff:document:1.2"'
+XLIFF = """<?xml version="1.0" encoding="utf-8"?>
+<xliff version="1.2"{ns}>
+  <file original="slides" source-language="en">
+    <header><note>Header note</note></header>
+    <body>
+      <trans-unit id="t1"><source>Welcome &amp; hello</source><note>Text box</note></trans-unit>
+      <trans-unit id="t2"><source>Speaker text</source><note>Slide Notes</note></trans-unit>
+      <group id="g"><trans-unit id="in-group"><source>Grouped</source></trans-unit></group>
+      <trans-unit id="t3"><source>A photo</source><note>Alt Text</note></trans-unit>
+      <trans-unit id="t4"><source>Next</source></trans-unit>
+    </body>
+  </file>
+  <file original="player" source-language="en">
+    <body>
+      <trans-unit id="p1"><source>Menu</source><context-group><context context-type="x">Player Notes</context></context-group></trans-unit>
+      <trans-unit id="p2"><source>Resources</source></trans-unit>
+    </body>
+  </file>
+  <file original="empty" source-language="en"><body/></file>
+</xliff>
+"""
+
+
+def load(script):
+    spec = importlib.util.spec_from_file_location("splitter", os.path.join(HERE, script))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def patterns(m):
+    return (
+        m.build_patterns(r"Notes|Slide Notes|Player Notes|note(s)?|x-?notes|storyline notes"),
+        m.build_patterns(r"Alt ?Text|AltText|Alternate Text|Accessibility|A11y|Image description|Alt of"),
+    )
+
+
+def expected_split(m, data, which):
+    """The input with every <file>/<body> trans-unit that doesn't belong in `which` removed."""
+    notes_pattern, alt_pattern = patterns(m)
+    root = ET.fromstring(data)
+    for f in m.findall(root, "file"):
+        for body in m.findall(f, "body"):
+            for tu in [c for c in body if c.tag in m.TU_TAGS]:
+                if which not in m.route_tu(tu, notes_pattern, alt_pattern, "notes", "main"):
+                    body.remove(tu)
+    return ET.tostring(root, encoding="unicode")
+
+
+def c14n(xml):
+    return ET.canonicalize(xml_data=xml)
+
+
+@pytest.mark.parametrize("script", SCRIPTS)
+@pytest.mark.parametrize("ns", [NS, ""], ids=["namespaced", "plain"])
+def test_split_matches_expected(script, ns):
+    m = load(script)
+    data = XLIFF.format(ns=ns).encode("utf-8")
+    notes_out, main_out = io.BytesIO(), io.BytesIO()
+    m.filter_xliff(io.BytesIO(data), *patterns(m), notes_out, main_out)
+
+    notes, main = notes_out.getvalue().decode("utf-8"), main_out.getvalue().decode("utf-8")
+    assert c14n(notes) == c14n(expected_split(m, data, "notes"))
+    assert c14n(main) == c14n(expected_split(m, data, "main"))
+    assert 'id="t2"' in notes and 'id="p1"' in notes and 'id="t1"' not in notes
+    assert 'id="t1"' in main and 'id="p2"' in main and 'id="t3"' not in main
+    # Units keep their own <file>; <group> stays in both outputs
+    assert main.index('id="p2"') > main.index('original="player"')
+    assert 'id="in-group"' in notes and 'id="in-group"' in main
+
+
+@pytest.mark.parametrize("script", SCRIPTS)
+def test_parse_error_leaves_outputs_untouched(script, tmp_path):
+    m = load(script)
+    entry = getattr(m, "main", None) or m._main_cli
+    src = tmp_path / "trunc.xlf"
+    src.write_bytes(XLIFF.format(ns=NS).encode("utf-8")[:400])
+    notes, main = tmp_path / "notes.xlf", tmp_path / "main.xlf"
+    notes.write_text("old notes")
+    main.write_text("old main")
+
+    for path in (src, tmp_path / "missing.xlf"):
+        assert entry([str(path), "--out-notes", str(notes), "--out-main", str(main)]) == 2
+        assert notes.read_text() == "old notes"
+        assert main.read_text() == "old main"
+    assert sorted(os.listdir(tmp_path)) == ["main.xlf", "notes.xlf", "trunc.xlf"]
+
+
+@pytest.mark.parametrize("script", SCRIPTS)
+def test_cli_replaces_outputs_with_split(script, tmp_path):
+    m = load(script)
+    entry = getattr(m, "main", None) or m._main_cli
+    data = XLIFF.format(ns=NS).encode("utf-8")
+    src = tmp_path / "in.xlf"
+    src.write_bytes(data)
+    notes, main = tmp_path / "notes.xlf", tmp_path / "main.xlf"
+    notes.write_text("old notes")
+
+    assert entry([str(src), "--out-notes", str(notes), "--out-main", str(main)]) == 0
+    notes_out, main_out = io.BytesIO(), io.BytesIO()
+    m.filter_xliff(io.BytesIO(data), *patterns(m), notes_out, main_out)
+    assert notes.read_bytes() == notes_out.getvalue()
+    assert main.read_bytes() == main_out.getvalue()
+    assert sorted(os.listdir(tmp_path)) == ["in.xlf", "main.xlf", "notes.xlf"]
+
+
+@pytest.mark.parametrize("script", SCRIPTS)
+def test_cli_same_output_path_gets_main_split(script, tmp_path):
+    m = load(script)
+    entry = getattr(m, "main", None) or m._main_cli
+    data = XLIFF.format(ns=NS).encode("utf-8")
+    src = tmp_path / "in.xlf"
+    src.write_bytes(data)
+    out = tmp_path / "out.xlf"
+    out.write_text("old")
+
+    assert entry([str(src), "--out-notes", str(out), "--out-main", str(out)]) == 0
+    notes_out, main_out = io.BytesIO(), io.BytesIO()
+    m.filter_xliff(io.BytesIO(data), *patterns(m), notes_out, main_out)
+    assert out.read_bytes() == main_out.getvalue()
+    assert sorted(os.listdir(tmp_path)) == ["in.xlf", "out.xlf"]
+    umask = os.umask(0)
+    os.umask(umask)
+    assert out.stat().st_mode & 0o777 == 0o666 & ~umask
+
+
+@pytest.mark.parametrize("script", SCRIPTS)
+def test_literal_patterns_use_aho_corasick(script):
+    ahocorasick = pytest.importorskip("ahocorasick")
+    m = load(script)
+    pattern = m.build_patterns("Notes|Slide Notes|AltText")
+    assert isinstance(pattern, ahocorasick.Automaton)
+    assert m.matches_any(["see the SLIDE NOTES"], pattern)
+    assert m.matches_any(["", "alttext: photo"], pattern)
+    assert not m.matches_any(["Alt Text", "Note"], pattern)
+    assert not m.matches_any([], pattern)
+    # Any regex metacharacter keeps the combined regex
+    assert isinstance(m.build_patterns("Notes|Alt ?Text"), re.Pattern)